@@ -1,7 +1,10 @@
+import mmap
+import pathlib
+import re
 import subprocess
 import time
-from typing import Optional, Union
-from collections import OrderedDict
+from typing import Optional, Union, Iterator, Deque, List
+from collections import OrderedDict, deque
 
 import schedule
 from excitingtools.input.xs import ExcitingXSInput
@@ -24,6 +27,89 @@ def find_job_state(job_info: str) -> str:
             return info.split('=')[1]
 
 
+class StreamedLog:
+    """
+    Log file of a calculation that is read line by line instead of being loaded into memory. Only a bounded tail and
+    a bounded number of error, warning and timing lines are kept, each line truncated to a maximum length, so memory
+    stays constant regardless of the log size. The full log stays on disk and is only read on request.
+    """
+    error_pattern = re.compile(r'error', re.IGNORECASE)
+    warning_pattern = re.compile(r'warning', re.IGNORECASE)
+    timing_pattern = re.compile(r'timing|wall time|cpu time|total time', re.IGNORECASE)
+    # entries of an exciting timing block, e.g. '  Hamiltonian and overlap matrix set up  :   1.09'
+    timing_entry_pattern = re.compile(r'^\s*[^:\s][^:]*:\s*[-+]?\d*\.?\d+([eEdD][-+]?\d+)?\s*$')
+    truncation_marker = '...\n'
+
+    def __init__(self, path: Union[str, pathlib.Path], tail_length: int = 100, max_extracted_lines: int = 100,
+                 max_line_length: int = 1000):
+        """
+        :param path: path to the log file
+        :param tail_length: number of lines kept from the end of the file
+        :param max_extracted_lines: maximum number of error, warning and timing lines kept each
+        :param max_line_length: maximum number of characters kept per line, longer lines are truncated and end with
+        the truncation marker
+        """
+        self.path = pathlib.Path(path)
+        self.tail: Deque[str] = deque(maxlen=tail_length)
+        self.errors: Deque[str] = deque(maxlen=max_extracted_lines)
+        self.warnings: Deque[str] = deque(maxlen=max_extracted_lines)
+        self.timings: Deque[str] = deque(maxlen=max_extracted_lines)
+        self.num_lines = 0
+        in_timing_block = False
+        with open(self.path, errors='replace') as fid:
+            while True:
+                line = fid.readline(max_line_length)
+                if not line:
+                    break
+                if not line.endswith('\n'):
+                    rest = fid.readline(max_line_length)
+                    if rest == '\n':
+                        line += rest
+                    elif rest:
+                        line += self.truncation_marker
+                        # skip the remainder of the truncated line without loading it
+                        while rest and not rest.endswith('\n'):
+                            rest = fid.readline(max_line_length)
+                self.num_lines += 1
+                self.tail.append(line)
+                if self.error_pattern.search(line):
+                    self.errors.append(line)
+                elif self.warning_pattern.search(line):
+                    self.warnings.append(line)
+                if self.timing_pattern.search(line):
+                    self.timings.append(line)
+                    in_timing_block = True
+                elif in_timing_block and self.timing_entry_pattern.match(line):
+                    self.timings.append(line)
+                else:
+                    in_timing_block = False
+
+    def lines(self) -> Iterator[str]:
+        """ Lazily iterate over all lines of the log file on disk.
+        """
+        with open(self.path, errors='replace') as fid:
+            yield from fid
+
+    def readlines(self) -> List[str]:
+        """ Read the full log file into memory.
+        """
+        return list(self.lines())
+
+    def memory_map(self) -> Optional[mmap.mmap]:
+        """ Memory-map the full log file (read only). The caller must close the map, e.g. by using it as context
+        manager.
+
+        :return: memory map of the log file, None if the file is empty
+        """
+        with open(self.path, 'rb') as fid:
+            if self.path.stat().st_size == 0:
+                return None
+            return mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __str__(self) -> str:
+        return ''.join(self.tail)
+
+
 class ExcitingSlurmCalculation(ExcitingCalculation):
     """
     Function for generating an exciting calculation on dune with slurm. You can write the necessary input files,
@@ -36,7 +122,8 @@ class ExcitingSlurmCalculation(ExcitingCalculation):
                  path_to_species_files: Union[ExcitingCalculation.path_type, ExcitingCalculation],
                  ground_state: Union[ExcitingGroundStateInput, ExcitingCalculation.path_type],
                  xs: Optional[ExcitingXSInput] = None,
-                 slurm_directives: Optional[OrderedDict] = None):
+                 slurm_directives: Optional[OrderedDict] = None,
+                 stream_output: bool = False):
         """
         :param name: title of the calculation
         :param directory: where to run the calculation
@@ -47,6 +134,7 @@ class ExcitingSlurmCalculation(ExcitingCalculation):
         from where the necessary files STATE.OUT and EFERMI.OUT are copied
         :param xs: optional xml xs info
         :param slurm_directives: slurm infos to specify how the calculation should be run
+        :param stream_output: if True, the slurm and terminal output are not read into memory but kept as StreamedLog
         """
         super().__init__(name, directory, structure, path_to_species_files, ground_state, BinaryRunner('', '', 1, 1),
                          xs)
@@ -61,6 +149,7 @@ class ExcitingSlurmCalculation(ExcitingCalculation):
                                                         cpus_per_task=4,
                                                         hint='nomultithread')
         self.slurm_directives = slurm_directives or default_directives
+        self.stream_output = stream_output
 
     def write_slurm_script(self):
         default_env_vars = OrderedDict([('EXE',
@@ -117,7 +206,15 @@ class ExcitingSlurmCalculation(ExcitingCalculation):
         self.wait_calculation_finish()
         return self.get_runresults(time_start)
 
-    def get_runresults(self, time_start: float = None) -> SubprocessRunResults:
+    def get_runresults(self, time_start: float = None, stream_output: Optional[bool] = None) -> SubprocessRunResults:
+        """
+        Collect the results of the finished slurm job.
+        :param time_start: time when the job was submitted
+        :param stream_output: if True, stdout and stderr are StreamedLog objects instead of lists of all lines.
+        Defaults to the stream_output attribute of the calculation.
+        """
+        if stream_output is None:
+            stream_output = self.stream_output
         if time_start is None:
             total_time = 0
         else:
@@ -128,7 +225,11 @@ class ExcitingSlurmCalculation(ExcitingCalculation):
             print("TIMEOUT reached!")
         elif self.status == 'FAILED':
             returncode = 1
-        with open(self.directory / ('slurm-' + str(self.jobnumber) + '.out')) as fid:
+        slurm_out = self.directory / ('slurm-' + str(self.jobnumber) + '.out')
+        if stream_output:
+            return SubprocessRunResults(StreamedLog(self.directory / 'terminal.out'), StreamedLog(slurm_out),
+                                        returncode, total_time)
+        with open(slurm_out) as fid:
             stderr = fid.readlines()
         with open(self.directory / 'terminal.out') as fid:
             stdout = fid.readlines()
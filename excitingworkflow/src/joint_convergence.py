@@ -0,0 +1,228 @@
+"""
+Joint convergence of several input parameters at once.
+"""
+from typing import Any, Union, Tuple, Callable, Dict, List, Sequence, Optional, cast
+
+import numpy as np
+from excitingtools.runner import SubprocessRunResults
+
+from excitingworkflow.src.calculation_io import CalculationIO, ConvergenceCriteria
+
+point_type = Tuple[int, ...]
+parameters_type = Dict[str, Any]
+result_type = Union[Dict[str, Any], SubprocessRunResults, FileNotFoundError]
+
+
+def is_failed(result: result_type) -> bool:
+    """
+    :return: True if the calculation failed to run or its output could not be parsed
+    """
+    return isinstance(result, (SubprocessRunResults, FileNotFoundError))
+
+
+class JointConvergence:
+    """
+    Converge several input parameters jointly instead of one after another. Each parameter has a range, ordered from
+    cheapest to most accurate. A parameter set meets the criteria if increasing any single parameter to its next value
+    gives a converged result. Only the calculations required to find such a set are run, and the cheapest evaluated
+    set that meets all criteria is selected.
+
+    Two sampling modes are supported:
+        * 'coordinate': converge one parameter after another, keeping the others fixed, and repeat the sweep until no
+          parameter changes anymore,
+        * 'adaptive': from the current set, step along the cheapest direction that is not converged yet.
+    Failed calculations are skipped: convergence is checked against the next value of the parameter that succeeded.
+    """
+    sampling_modes = ['coordinate', 'adaptive']
+
+    def __init__(self,
+                 inputs: Dict[str, Sequence[Any]],
+                 calculation_factory: Callable[[parameters_type], CalculationIO],
+                 criteria: Union[ConvergenceCriteria, Dict[str, ConvergenceCriteria]],
+                 cost: Callable[[parameters_type], float],
+                 sampling: str = 'coordinate'):
+        """
+        :param inputs: ranges of input values, {parameter name: values ordered from cheapest to most accurate}
+        :param calculation_factory: returns a calculation for a given parameter set {parameter name: value}
+        :param criteria: convergence criteria for all parameters OR one criteria per parameter name
+        :param cost: estimate of the cost of a calculation for a given parameter set, e.g. number of k-points times
+        number of basis functions (which grows roughly as rgkmax**3)
+        :param sampling: how to explore the parameter grid, either 'coordinate' or 'adaptive'
+        """
+        if not inputs:
+            raise ValueError('inputs must contain at least one parameter.')
+        for name, values in inputs.items():
+            if len(values) <= 1:
+                raise ValueError(f'input range of {name} must have a length > 1')
+        if isinstance(criteria, dict) and set(criteria) != set(inputs):
+            raise ValueError(f'Keys of criteria inconsistent with keys of inputs: {set(criteria)} != {set(inputs)}')
+        if sampling not in self.sampling_modes:
+            raise ValueError(f'sampling must be one of {self.sampling_modes}, not {sampling}.')
+        self.inputs = inputs
+        self.names = list(inputs)
+        self.calculation_factory = calculation_factory
+        self.criteria = criteria
+        self.cost = cost
+        self.sampling = sampling
+        self.results: Dict[point_type, result_type] = {}
+        self.converged: Dict[Tuple[point_type, int], bool] = {}
+
+    def parameters(self, point: point_type) -> parameters_type:
+        """
+        :param point: indices into the input ranges
+        :return: parameter set {parameter name: value}
+        """
+        return {name: self.inputs[name][index] for name, index in zip(self.names, point)}
+
+    def point_cost(self, point: point_type) -> float:
+        return self.cost(self.parameters(point))
+
+    def get_result(self, point: point_type) -> result_type:
+        """
+        Run the calculation for a parameter set, or return the cached result if it has already been run.
+        Failed runs are returned as SubprocessRunResults, missing output files as FileNotFoundError.
+        """
+        if point not in self.results:
+            calculation = self.calculation_factory(self.parameters(point))
+            calculation.write_inputs()
+            run_result = calculation.run()
+            if isinstance(run_result, SubprocessRunResults) and not run_result.success:
+                self.results[point] = run_result
+            else:
+                try:
+                    self.results[point] = calculation.parse_output()
+                except FileNotFoundError as error:
+                    self.results[point] = error
+        return self.results[point]
+
+    def step(self, point: point_type, axis: int) -> Optional[point_type]:
+        """
+        :return: point with parameter `axis` increased to its next value, None if the range is exhausted
+        """
+        if point[axis] + 1 >= len(self.inputs[self.names[axis]]):
+            return None
+        return point[:axis] + (point[axis] + 1,) + point[axis + 1:]
+
+    def next_point(self, point: point_type, axis: int) -> Optional[point_type]:
+        """
+        Find the next parameter set along `axis` whose calculation succeeded. Failed values are skipped.
+        Runs the calculations if needed.
+        :return: next successful point, None if the range is exhausted
+        """
+        next_point = self.step(point, axis)
+        while next_point is not None and is_failed(self.get_result(next_point)):
+            next_point = self.step(next_point, axis)
+        return next_point
+
+    def is_converged(self, point: point_type, axis: int) -> bool:
+        """
+        Check whether increasing parameter `axis` from `point` to the next successful value changes the result.
+        Runs the calculations if needed. A failed calculation at `point` or an exhausted range counts as not converged.
+        """
+        if (point, axis) in self.converged:
+            return self.converged[(point, axis)]
+        prior = self.get_result(point)
+        next_point = None if is_failed(prior) else self.next_point(point, axis)
+        if next_point is None:
+            converged = False
+        else:
+            current = self.get_result(next_point)
+            criteria = self.criteria
+            if isinstance(criteria, dict):
+                criteria = criteria[self.names[axis]]
+            converged, early_exit = criteria.evaluate(cast(Dict[str, Any], current), cast(Dict[str, Any], prior))
+            converged = converged and not early_exit
+        self.converged[(point, axis)] = converged
+        return converged
+
+    def meets_criteria(self, point: point_type) -> bool:
+        """
+        Check with already evaluated results only, whether a parameter set is converged w.r.t. all parameters.
+        """
+        return all(self.converged.get((point, axis), False) for axis in range(len(self.names)))
+
+    def _sample_coordinate(self, point: point_type) -> point_type:
+        changed = True
+        while changed:
+            changed = False
+            for axis in range(len(self.names)):
+                while not self.is_converged(point, axis):
+                    next_point = self.next_point(point, axis)
+                    if next_point is None:
+                        return point
+                    point = next_point
+                    changed = True
+        return point
+
+    def _sample_adaptive(self, point: point_type) -> point_type:
+        while True:
+            steps = [(axis, self.step(point, axis)) for axis in range(len(self.names))]
+            # check the cheapest direction first, such that only the neighbour which is stepped to is run in addition
+            # to the neighbours needed to verify convergence
+            steps.sort(key=lambda x: np.inf if x[1] is None else self.point_cost(x[1]))
+            for axis, _ in steps:
+                if not self.is_converged(point, axis):
+                    next_point = self.next_point(point, axis)
+                    if next_point is None:
+                        return point
+                    point = next_point
+                    break
+            else:
+                return point
+
+    def accuracy(self, point: point_type) -> int:
+        """
+        :return: number of parameters for which convergence was checked at `point` and found to be converged
+        """
+        return sum(self.converged.get((point, axis), False) for axis in range(len(self.names)))
+
+    def pareto_front(self) -> List[point_type]:
+        """
+        Successfully evaluated parameter sets which are not dominated in (cost, accuracy), sorted by cost. Accuracy is
+        the number of parameters that were checked and found converged, see `accuracy`. Of several sets with the same
+        cost, only the most accurate one is kept.
+        """
+        best_per_cost: Dict[float, point_type] = {}
+        for point in self.results:
+            if is_failed(self.results[point]):
+                continue
+            cost = self.point_cost(point)
+            if cost not in best_per_cost or self.accuracy(point) > self.accuracy(best_per_cost[cost]):
+                best_per_cost[cost] = point
+
+        front = []
+        best_accuracy = -1
+        for cost in sorted(best_per_cost):
+            point = best_per_cost[cost]
+            if self.accuracy(point) > best_accuracy:
+                front.append(point)
+                best_accuracy = self.accuracy(point)
+        return front
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Explore the parameter grid, starting with the cheapest value of each parameter.
+        :return: Dictionary with the cheapest parameter set that meets all criteria ('parameters', None if no set
+        meets them), its 'cost' and 'result', the Pareto front of evaluated sets, the 'failed' parameter sets, the
+        number of calculations run, the number of calculations of a full tensor sweep and the number of calculations
+        avoided.
+        """
+        start = tuple(0 for _ in self.names)
+        if self.sampling == 'coordinate':
+            self._sample_coordinate(start)
+        else:
+            self._sample_adaptive(start)
+
+        accepted = [point for point in self.results if self.meets_criteria(point)]
+        best = min(accepted, key=self.point_cost) if accepted else None
+
+        n_full_sweep = int(np.prod([len(values) for values in self.inputs.values()]))
+        n_calculations = len(self.results)
+        return {'parameters': None if best is None else self.parameters(best),
+                'cost': None if best is None else self.point_cost(best),
+                'result': None if best is None else self.results[best],
+                'pareto_front': [self.parameters(point) for point in self.pareto_front()],
+                'failed': [self.parameters(point) for point in self.results if is_failed(self.results[point])],
+                'n_calculations': n_calculations,
+                'n_full_sweep': n_full_sweep,
+                'n_avoided': n_full_sweep - n_calculations}
@@ -1,4 +1,4 @@
-from excitingworkflow.src.exciting_slurm_calculation import ExcitingSlurmCalculation
+from excitingworkflow.src.exciting_slurm_calculation import ExcitingSlurmCalculation, StreamedLog
 from excitingtools.input.ground_state import ExcitingGroundStateInput
 from excitingtools.input.structure import ExcitingStructure
 from excitingtools.input.xs import ExcitingXSInput
@@ -99,3 +99,120 @@ def test_run_full_bse_calculation(tmpdir):
         assert RuntimeError('Calculation error occured!')
     result = calculation1.parse_output()
     # TODO: Add asserts to see if calculation was successful
+
+
+def test_streamed_log(tmpdir):
+    """
+    Test that only a bounded part of the log is kept in memory.
+    """
+    log_lines = [f'line {i}\n' for i in range(1000)]
+    log_lines[10] = 'Warning: large number of empty states\n'
+    log_lines[500] = 'Error(bse): matrix not positive definite\n'
+    log_lines[998] = 'Total time spent (seconds) : 12.3\n'
+    path = tmpdir / 'terminal.out'
+    with open(path, 'w') as fid:
+        fid.writelines(log_lines)
+
+    log = StreamedLog(path, tail_length=5)
+    assert log.num_lines == 1000
+    assert list(log.tail) == log_lines[-5:]
+    assert list(log.errors) == [log_lines[500]]
+    assert list(log.warnings) == [log_lines[10]]
+    assert list(log.timings) == [log_lines[998]]
+    assert log.readlines() == log_lines
+    with log.memory_map() as log_map:
+        assert log_map[:6] == b'line 0'
+
+
+def test_streamed_log_truncation_and_empty_file(tmpdir):
+    """
+    Test that long lines are truncated and that empty files are not memory-mapped.
+    """
+    path = tmpdir / 'terminal.out'
+    with open(path, 'w') as fid:
+        fid.write('x' * 5000 + '\n' + 'y' * 100 + '\nlast line\n')
+    log = StreamedLog(path, max_line_length=100)
+    assert log.num_lines == 3
+    assert list(log.tail) == ['x' * 100 + '...\n', 'y' * 100 + '\n', 'last line\n']
+    assert str(log) == 'x' * 100 + '...\n' + 'y' * 100 + '\nlast line\n'
+
+    empty_path = tmpdir / 'empty.out'
+    empty_path.write('')
+    empty_log = StreamedLog(empty_path)
+    assert empty_log.num_lines == 0
+    assert empty_log.memory_map() is None
+
+
+def test_streamed_log_timing_block(tmpdir):
+    """
+    Test that all entries of an exciting timing block are extracted.
+    """
+    timing_block = [' Timings (CPU seconds) :\n',
+                    '     initialisation                                  :         0.20\n',
+                    '     Hamiltonian and overlap matrix set up           :         1.09\n',
+                    '     first-variational secular equation              :         1.64\n',
+                    '     charge density calculation                      :         0.33\n',
+                    '     potential calculation                           :         0.18\n',
+                    '     total                                           :         3.44\n']
+    path = tmpdir / 'terminal.out'
+    with open(path, 'w') as fid:
+        fid.write(' Fermi energy                                  :        0.1234\n')
+        fid.writelines(timing_block)
+        fid.write('\n Number of bands                               :            50\n')
+    log = StreamedLog(path)
+    assert list(log.timings) == timing_block
+
+
+def test_streamed_log_invalid_bytes(tmpdir):
+    """
+    Test that bytes which are not valid UTF-8 do not abort reading the log.
+    """
+    path = tmpdir / 'slurm-1.out'
+    with open(path, 'wb') as fid:
+        fid.write(b'\xff\xfe error\n')
+    log = StreamedLog(path)
+    assert list(log.errors) == ['\ufffd\ufffd error\n']
+    assert log.readlines() == ['\ufffd\ufffd error\n']
+
+
+def initialize_finished_calculation(directory, stream_output: bool = False) -> ExcitingSlurmCalculation:
+    """
+    Calculation with fake slurm and terminal output of a finished job.
+    """
+    lattice = [[0.5, 0.0, 0.0], [0.0, 0.5, 0.0], [0.0, 0.0, 0.5]]
+    atoms = [{'species': 'Li', 'position': [0, 0, 0]},
+             {'species': 'F', 'position': [0.5, 0.5, 0.5]}]
+    structure = ExcitingStructure(atoms, lattice, str(directory), structure_properties={'autormt': True})
+    groundstate = ExcitingGroundStateInput(ngridk=[3, 3, 3], rgkmax=5.0, do='fromscratch')
+    calculation = ExcitingSlurmCalculation('test3', str(directory), structure, str(directory), groundstate,
+                                           stream_output=stream_output)
+    calculation.jobnumber = 42
+    calculation.status = 'FAILED'
+    with open(calculation.directory / 'slurm-42.out', 'w') as fid:
+        fid.write('srun: error: task 0: Exited with exit code 1\n')
+    with open(calculation.directory / 'terminal.out', 'w') as fid:
+        fid.write('Warning(init): large number of empty states\nTotal time spent (seconds) : 1.2\n')
+    return calculation
+
+
+def test_get_runresults(tmpdir):
+    """
+    Test that slurm output is read into lists by default and streamed on request.
+    """
+    calculation = initialize_finished_calculation(tmpdir)
+    run_result = calculation.get_runresults()
+    assert run_result.stdout == ['Warning(init): large number of empty states\n',
+                                 'Total time spent (seconds) : 1.2\n']
+    assert run_result.stderr == ['srun: error: task 0: Exited with exit code 1\n']
+    assert run_result.return_code == 1
+
+    for run_result in [calculation.get_runresults(stream_output=True),
+                       initialize_finished_calculation(tmpdir, stream_output=True).get_runresults()]:
+        assert isinstance(run_result.stdout, StreamedLog)
+        assert isinstance(run_result.stderr, StreamedLog)
+        assert run_result.stdout.path.name == 'terminal.out'
+        assert list(run_result.stdout.warnings) == ['Warning(init): large number of empty states\n']
+        assert list(run_result.stdout.timings) == ['Total time spent (seconds) : 1.2\n']
+        assert run_result.stderr.path.name == 'slurm-42.out'
+        assert list(run_result.stderr.errors) == ['srun: error: task 0: Exited with exit code 1\n']
+        assert run_result.return_code == 1
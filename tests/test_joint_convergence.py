@@ -0,0 +1,132 @@
+import pathlib
+from typing import Tuple, Optional
+
+import numpy as np
+import pytest
+from excitingtools.runner import SubprocessRunResults
+
+from excitingworkflow.src.calculation_io import CalculationIO, ConvergenceCriteria
+from excitingworkflow.src.joint_convergence import JointConvergence
+
+
+class ProductCalculation(CalculationIO):
+    """
+    Result converges exponentially in both parameters. Runs with a == fail_run_a fail, output of runs with
+    a == fail_parse_a is missing.
+    """
+    def __init__(self, name: str, directory: CalculationIO.path_type, parameters: dict,
+                 fail_run_a: Optional[int] = None, fail_parse_a: Optional[int] = None):
+        super().__init__(name, directory)
+        self.parameters = parameters
+        self.fail_run_a = fail_run_a
+        self.fail_parse_a = fail_parse_a
+        self.value = None
+
+    def write_inputs(self):
+        pass
+
+    def run(self) -> SubprocessRunResults:
+        if self.parameters['a'] == self.fail_run_a:
+            return SubprocessRunResults([], ['Error'], 1, 0.)
+        self.value = (1 + np.exp(-self.parameters['a'])) * (1 + np.exp(-self.parameters['b']))
+        return SubprocessRunResults([], [], 0, 0.)
+
+    def parse_output(self) -> dict:
+        if self.parameters['a'] == self.fail_parse_a:
+            raise FileNotFoundError('out.txt')
+        return {'value': self.value}
+
+
+class AbsoluteConvergenceCriteria(ConvergenceCriteria):
+    def evaluate(self, current: dict, prior: dict) -> Tuple[bool, bool]:
+        return abs(current['value'] - prior['value']) < self.criteria['value'], False
+
+
+def product_cost(parameters: dict) -> float:
+    return float(parameters['a'] * parameters['b'])
+
+
+inputs = {'a': [1, 2, 3, 4, 5, 6, 7, 8], 'b': [1, 2, 3, 4, 5, 6, 7, 8]}
+
+
+def get_factory(directory, **kwargs):
+    def factory(parameters: dict) -> ProductCalculation:
+        name = f"a{parameters['a']}_b{parameters['b']}"
+        return ProductCalculation(name, pathlib.Path(directory) / name, parameters, **kwargs)
+    return factory
+
+
+@pytest.mark.parametrize('sampling, n_calculations', [('coordinate', 12), ('adaptive', 15)])
+def test_joint_convergence(tmpdir, sampling, n_calculations):
+    criteria = AbsoluteConvergenceCriteria(inputs['a'], {'value': 0.01})
+    convergence = JointConvergence(inputs, get_factory(tmpdir), criteria, product_cost, sampling=sampling)
+    result = convergence.run()
+    assert result['parameters'] == {'a': 5, 'b': 5}
+    assert result['cost'] == 25
+    assert result['result'] == convergence.results[(4, 4)]
+    assert result['pareto_front'] == [{'a': 1, 'b': 1}, {'a': 5, 'b': 1}, {'a': 5, 'b': 5}]
+    assert result['n_full_sweep'] == 64
+    assert result['n_calculations'] == n_calculations
+    assert result['n_avoided'] == 64 - n_calculations
+
+
+@pytest.mark.parametrize('sampling, n_calculations', [('coordinate', 14), ('adaptive', 18)])
+def test_joint_convergence_per_parameter_criteria(tmpdir, sampling, n_calculations):
+    criteria = {'a': AbsoluteConvergenceCriteria(inputs['a'], {'value': 0.01}),
+                'b': AbsoluteConvergenceCriteria(inputs['b'], {'value': 0.001})}
+    convergence = JointConvergence(inputs, get_factory(tmpdir), criteria, product_cost, sampling=sampling)
+    result = convergence.run()
+    assert result['parameters'] == {'a': 5, 'b': 7}
+    assert result['n_calculations'] == n_calculations
+    assert result['n_avoided'] == 64 - n_calculations
+
+    with pytest.raises(ValueError, match='Keys of criteria inconsistent with keys of inputs'):
+        JointConvergence(inputs, get_factory(tmpdir), {'a': criteria['a']}, product_cost, sampling=sampling)
+
+
+@pytest.mark.parametrize('sampling, n_calculations', [('coordinate', 12), ('adaptive', 15)])
+@pytest.mark.parametrize('failure', ['fail_run_a', 'fail_parse_a'])
+def test_joint_convergence_failed_calculation(tmpdir, sampling, n_calculations, failure):
+    criteria = AbsoluteConvergenceCriteria(inputs['a'], {'value': 0.01})
+    convergence = JointConvergence(inputs, get_factory(tmpdir, **{failure: 3}), criteria, product_cost,
+                                   sampling=sampling)
+    result = convergence.run()
+    assert result['parameters'] == {'a': 5, 'b': 5}
+    assert result['failed'] == [{'a': 3, 'b': 1}]
+    assert result['n_calculations'] == n_calculations
+    # a = 3 is skipped, a = 2 is compared against a = 4
+    assert not convergence.converged[((1, 0), 0)]
+    assert ((2, 0), 0) not in convergence.converged
+
+
+@pytest.mark.parametrize('sampling', JointConvergence.sampling_modes)
+@pytest.mark.parametrize('failure', ['fail_run_a', 'fail_parse_a'])
+def test_joint_convergence_failed_last_value(tmpdir, sampling, failure):
+    criteria = AbsoluteConvergenceCriteria(inputs['a'], {'value': 1.e-6})
+    convergence = JointConvergence(inputs, get_factory(tmpdir, **{failure: 8}), criteria, product_cost,
+                                   sampling=sampling)
+    result = convergence.run()
+    assert result['parameters'] is None
+    assert result['failed'] == [{'a': 8, 'b': 1}]
+
+
+def test_pareto_front_equal_cost(tmpdir):
+    criteria = AbsoluteConvergenceCriteria(inputs['a'], {'value': 0.01})
+    convergence = JointConvergence(inputs, get_factory(tmpdir), criteria, product_cost)
+    convergence.results = {(0, 0): {}, (0, 1): {}, (1, 0): {}, (1, 1): SubprocessRunResults([], [], 1, 0.)}
+    convergence.converged = {((0, 1), 0): True, ((1, 0), 0): True, ((1, 0), 1): True}
+    assert convergence.accuracy((0, 1)) == 1
+    assert convergence.accuracy((1, 0)) == 2
+    assert convergence.pareto_front() == [(0, 0), (1, 0)]
+
+
+@pytest.mark.parametrize('sampling', JointConvergence.sampling_modes)
+def test_joint_convergence_not_converged(tmpdir, sampling):
+    criteria = AbsoluteConvergenceCriteria(inputs['a'], {'value': 1.e-6})
+    convergence = JointConvergence(inputs, get_factory(tmpdir), criteria, product_cost, sampling=sampling)
+    result = convergence.run()
+    assert result['parameters'] is None
+    assert result['cost'] is None
+    assert result['result'] is None
+    assert result['failed'] == []
+    assert result['n_avoided'] == result['n_full_sweep'] - result['n_calculations']